@@ -1,8 +1,14 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
+import numpy as np
 import time
+import threading
+import hashlib
+import hmac
+import os
 import pytz
+from contextlib import contextmanager
 
 # --- CUSTOM DESIGN & STYLING ---
 # Setting Streamlit page config and custom CSS for a cleaner look
@@ -13,8 +19,7 @@ st.set_page_config(
 )
 
 # Custom CSS for main title and general look
-st.markdown(
-    """
+APP_CSS = """
     <style>
     /* Ensure the main content uses a pleasing font (like Segoe UI or similar clean sans-serif) */
     .stApp {
@@ -53,16 +58,81 @@ st.markdown(
         font-size: 0.9em;
     }
     </style>
-    """,
-    unsafe_allow_html=True
-)
+"""
+
+# Streamlit removes elements that are not re-emitted on a rerun, so the style block
+# is written on every run rather than gated to once per session.
+st.markdown(APP_CSS, unsafe_allow_html=True)
 
 # --- DATABASE SETUP ---
 DB_NAME = 'bookstore.db'
 
+# Hot-path statements, named and shared here so every helper that runs one uses the same text.
+# (Statement caching itself comes from cached_statements on the connection, not from these constants.)
+SQL_GET_ALL_BOOKS = "SELECT id, name, author, copies FROM books"
+SQL_GET_BOOK = "SELECT id, name, author, copies FROM books WHERE id=?"
+SQL_ADD_BOOK = "INSERT INTO books (name, author, copies) VALUES (?, ?, ?)"
+SQL_UPDATE_BOOK = "UPDATE books SET name=?, author=?, copies=? WHERE id=?"
+SQL_DELETE_BOOK = "DELETE FROM books WHERE id=?"
+SQL_ADD_USER = "INSERT INTO users (username, email, password, is_admin, salt) VALUES (?, ?, ?, ?, ?)"
+SQL_GET_LOGIN = "SELECT password, salt, is_admin FROM users WHERE username = ?"
+SQL_GET_ALL_USERS = "SELECT id, username, email, is_admin FROM users"
+SQL_ADD_ORDER = "INSERT INTO orders (book_id, username, quantity, status) VALUES (?, ?, ?, 'Pending')"
+SQL_GET_PENDING_ORDER = "SELECT book_id, quantity FROM orders WHERE id = ? AND status = 'Pending'"
+SQL_DECREMENT_STOCK = "UPDATE books SET copies = copies - ? WHERE id = ? AND copies >= ?"
+SQL_COMPLETE_ORDER = "UPDATE orders SET status = 'Completed' WHERE id = ?"
+SQL_GET_BOOK_COPIES = "SELECT copies FROM books WHERE id = ?"
+SQL_GET_STOCK_REPORT = """
+    SELECT id, name, author, copies,
+           CASE WHEN copies = 0 THEN 'out' ELSE 'low' END AS bucket
+    FROM books WHERE copies <= ?
+"""
+
+@st.cache_resource
+def get_conn():
+    """
+    Opens a single SQLite connection that is shared across reruns instead of reconnecting per call.
+    The PRAGMAs (WAL journal, relaxed fsync, in-memory temp tables, larger page cache, mmap)
+    are applied here once, when the cached connection is first created.
+    """
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, isolation_level=None, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+@st.cache_resource
+def get_write_lock():
+    """Returns the lock used to serialize writers on the shared connection."""
+    return threading.Lock()
+
+@contextmanager
+def write_transaction(c, begin="BEGIN"):
+    """
+    Holds the writer lock and runs the enclosed statements as one transaction.
+    Any error rolls it back, so the shared connection is never left inside an open transaction.
+    """
+    with get_write_lock():
+        c.execute(begin)
+        try:
+            yield
+            c.execute("COMMIT")
+        except Exception:
+            if c.connection.in_transaction:
+                c.execute("ROLLBACK")
+            # total_changes does not go back down on ROLLBACK, so drop anything cached from rolled-back rows
+            get_table_cache().clear()
+            raise
+
+@st.cache_resource
 def init_db():
-    """Initializes the SQLite database, creates tables, and ensures only one admin exists (UPDATED)."""
-    conn = sqlite3.connect(DB_NAME)
+    """
+    Initializes the SQLite database, creates tables, and ensures only one admin exists (UPDATED).
+    Cached as a resource so the schema work and migrations run once per process, not on every rerun.
+    """
+    conn = get_conn()
     c = conn.cursor()
 
     # 1. Books Table
@@ -95,150 +165,232 @@ def init_db():
             username TEXT UNIQUE NOT NULL,
             email TEXT NOT NULL,
             password TEXT NOT NULL,
-            is_admin INTEGER DEFAULT 0
+            is_admin INTEGER DEFAULT 0,
+            salt TEXT
         )
     """)
+    # Older databases predate the salt column; add it so plaintext passwords can be migrated
+    c.execute("PRAGMA table_info(users)")
+    if 'salt' not in [col[1] for col in c.fetchall()]:
+        c.execute("ALTER TABLE users ADD COLUMN salt TEXT")
+
+    # 4. Orders "materialized view": orders joined with the book name, kept in sync by triggers
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders_mv'")
+    orders_mv_exists = c.fetchone() is not None
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS orders_mv (
+            order_id INTEGER PRIMARY KEY,
+            book_id INTEGER,
+            username TEXT,
+            book_name TEXT,
+            quantity INTEGER,
+            status TEXT,
+            timestamp DATETIME
+        )
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_mv_insert AFTER INSERT ON orders
+        BEGIN
+            INSERT INTO orders_mv (order_id, book_id, username, book_name, quantity, status, timestamp)
+            SELECT NEW.id, NEW.book_id, NEW.username, b.name, NEW.quantity, NEW.status, NEW.timestamp
+            FROM books b WHERE b.id = NEW.book_id;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_mv_update AFTER UPDATE ON orders
+        BEGIN
+            UPDATE orders_mv
+            SET username = NEW.username, quantity = NEW.quantity, status = NEW.status, timestamp = NEW.timestamp
+            WHERE order_id = NEW.id;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_mv_book_name AFTER UPDATE OF name ON books
+        WHEN NEW.name IS NOT OLD.name
+        BEGIN
+            UPDATE orders_mv SET book_name = NEW.name WHERE book_id = NEW.id;
+        END
+    """)
+    # Orders for a deleted book disappear from the view, matching the old inner JOIN
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_mv_book_delete AFTER DELETE ON books
+        BEGIN
+            DELETE FROM orders_mv WHERE book_id = OLD.id;
+        END
+    """)
+    if not orders_mv_exists:
+        # Backfill once from orders placed before the view existed
+        c.execute("""
+            INSERT INTO orders_mv (order_id, book_id, username, book_name, quantity, status, timestamp)
+            SELECT o.id, o.book_id, o.username, b.name, o.quantity, o.status, o.timestamp
+            FROM orders o
+            JOIN books b ON o.book_id = b.id
+        """)
+
+    # 5. Indexes for the hot filters/sorts (order lists by status or user, stock reports)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_mv_status_ts ON orders_mv(status, timestamp DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_mv_user_ts ON orders_mv(username, timestamp DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_books_copies ON books(copies)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_orders_mv_book ON orders_mv(book_id)")
+    c.execute("ANALYZE")
     
     # 1. Attempt to insert the default admin user ('library') if it doesn't exist.
-    try:
-        c.execute("INSERT INTO users (username, email, password, is_admin) VALUES (?, ?, ?, ?)", 
-                  ('Admin', 'admin@bookstore.com', '12345', 1))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        pass
-
-    # 2. DELETE THE OLD ADMIN IF A NEW ADMIN ACCOUNT WAS CREATED MANUALLY
-    
-    # Check if a manually created admin exists (i.e., if admin count is > 1)
-    c.execute("SELECT COUNT(id) FROM users WHERE is_admin = 1")
-    admin_count = c.fetchone()[0]
-
-    if admin_count > 1:
-        # If a new admin account exists, delete the old, hardcoded 'library' account
-        # We ensure we delete only the original hardcoded account
-        c.execute("DELETE FROM users WHERE username = 'library' AND email = 'admin@bookstore.com'")
-        conn.commit()
-
-    conn.commit()
-    conn.close()
+    # The admin bootstrap runs as one transaction so it costs a single commit.
+    with write_transaction(c):
+        # Only hash the default password when the admin is actually missing (scrypt is deliberately slow)
+        c.execute("SELECT 1 FROM users WHERE username = 'Admin'")
+        if c.fetchone() is None:
+            salt = os.urandom(16).hex()
+            c.execute("INSERT INTO users (username, email, password, is_admin, salt) VALUES (?, ?, ?, ?, ?)", 
+                      ('Admin', 'admin@bookstore.com', hash_password('12345', salt), 1, salt))
+
+        # Hash any passwords still stored in plaintext (rows without a salt)
+        c.execute("SELECT id, password FROM users WHERE salt IS NULL")
+        for user_id, plain_password in c.fetchall():
+            salt = os.urandom(16).hex()
+            c.execute("UPDATE users SET password = ?, salt = ? WHERE id = ?", 
+                      (hash_password(plain_password, salt), salt, user_id))
+
+        # 2. DELETE THE OLD ADMIN IF A NEW ADMIN ACCOUNT WAS CREATED MANUALLY
+        
+        # Check if a manually created admin exists (i.e., if admin count is > 1)
+        c.execute("SELECT COUNT(id) FROM users WHERE is_admin = 1")
+        admin_count = c.fetchone()[0]
+
+        if admin_count > 1:
+            # If a new admin account exists, delete the old, hardcoded 'library' account
+            # We ensure we delete only the original hardcoded account
+            c.execute("DELETE FROM users WHERE username = 'library' AND email = 'admin@bookstore.com'")
+
+def query_df(sql, params=(), cols=None):
+    """Runs a query on the shared connection and builds a DataFrame straight from the fetched rows."""
+    cur = get_conn().execute(sql, params)
+    cols = cols or [d[0] for d in cur.description]
+    return pd.DataFrame.from_records(cur.fetchall(), columns=cols)
+
+@st.cache_resource
+def get_table_cache():
+    """Returns the process-wide cache of full-table DataFrames, shared by all sessions."""
+    return {}
+
+def get_db_version():
+    """
+    Returns a value that changes whenever the database is written.
+    PRAGMA data_version only moves on commits from other connections, so it is
+    paired with total_changes to also catch writes made through the shared connection.
+    """
+    conn = get_conn()
+    return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+def cached_table_df(key, sql):
+    """Serves a full-table query from the in-process cache until the database version changes."""
+    cache = get_table_cache()
+    version = get_db_version()
+    entry = cache.get(key)
+    if entry is None or entry[0] != version:
+        # A write transaction open on the shared connection exposes uncommitted rows; read them without caching
+        if get_conn().in_transaction:
+            return query_df(sql)
+        entry = (version, query_df(sql))
+        cache[key] = entry
+    # Callers add/drop columns on the result, so hand out a copy
+    return entry[1].copy()
 
 # --- BOOK CRUD FUNCTIONS ---
 
 def add_book(name, author, copies):
     """Adds a new book to the database."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("INSERT INTO books (name, author, copies) VALUES (?, ?, ?)", 
-              (name, author, copies))
-    conn.commit()
-    conn.close()
+    conn = get_conn()
+    with get_write_lock():
+        conn.execute(SQL_ADD_BOOK, (name, author, copies))
+    get_stock_report.clear()
 
 def get_all_books():
     """Retrieves all books as a Pandas DataFrame."""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT id, name, author, copies FROM books", conn)
-    conn.close()
-    return df
+    return cached_table_df('books', SQL_GET_ALL_BOOKS)
 
 def get_book_by_id(book_id):
     """Retrieves a single book's details based on its ID."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, name, author, copies FROM books WHERE id=?", (book_id,))
-    book = c.fetchone()
-    conn.close()
-    return book 
+    return get_conn().execute(SQL_GET_BOOK, (book_id,)).fetchone()
 
 def update_book(book_id, name, author, copies):
     """Updates the details of an existing book."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("UPDATE books SET name=?, author=?, copies=? WHERE id=?", 
-              (name, author, copies, book_id))
-    conn.commit()
-    conn.close()
+    conn = get_conn()
+    with get_write_lock():
+        conn.execute(SQL_UPDATE_BOOK, (name, author, copies, book_id))
+    get_stock_report.clear()
+    get_user_orders.clear()
 
 def delete_book(book_id):
     """Deletes a book from the database based on its ID."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM books WHERE id=?", (book_id,))
-    conn.commit()
-    conn.close()
+    conn = get_conn()
+    with get_write_lock():
+        conn.execute(SQL_DELETE_BOOK, (book_id,))
+    get_stock_report.clear()
+    get_user_orders.clear()
     return True
     
 # --- AUTH & ORDER FUNCTIONS ---
 
+def hash_password(password, salt):
+    """Derives a hex-encoded scrypt hash of the password using the given hex salt."""
+    return hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=16384, r=8, p=1).hex()
+
 def register_user(username, email, password):
     """Adds a new user to the database with is_admin=0 (regular user)."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    conn = get_conn()
+    salt = os.urandom(16).hex()
+    # Hash before taking the writer lock; scrypt is deliberately slow and would block all other writes
+    password_hash = hash_password(password, salt)
     try:
-        c.execute("INSERT INTO users (username, email, password, is_admin) VALUES (?, ?, ?, ?)", 
-                  (username, email, password, 0))
-        conn.commit()
-        conn.close()
+        with get_write_lock():
+            conn.execute(SQL_ADD_USER, (username, email, password_hash, 0, salt))
         return True, "Registration successful!"
     except sqlite3.IntegrityError:
-        conn.close()
         return False, "Username already exists. Please choose another."
     except Exception as e:
-        conn.close()
         return False, f"An error occurred: {e}"
 
 def verify_login(username, password):
-    """Checks the database for matching username and password."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT is_admin FROM users WHERE username = ? AND password = ?", 
-              (username, password))
-    result = c.fetchone()
-    conn.close()
+    """Looks the user up by username and checks the password against the stored scrypt hash."""
+    result = get_conn().execute(SQL_GET_LOGIN, (username,)).fetchone()
     
     if result:
-        return True, result[0] 
+        stored_hash, salt, is_admin = result
+        if hmac.compare_digest(stored_hash, hash_password(password, salt)):
+            return True, is_admin 
     return False, None
 
 def get_all_users():
     """Retrieves all registered users as a Pandas DataFrame."""
-    conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT id, username, email, is_admin FROM users", conn)
-    conn.close()
-    return df
+    return cached_table_df('users', SQL_GET_ALL_USERS)
 
-def get_low_stock_books(threshold=5):
-    """Retrieves books with copies less than or equal to the defined threshold."""
-    conn = sqlite3.connect(DB_NAME)
-    query = "SELECT id, name, copies FROM books WHERE copies <= ? AND copies > 0"
-    df = pd.read_sql_query(query, conn, params=(threshold,))
-    conn.close()
-    return df
-
-def get_out_of_stock_books():
-    """Retrieves books with exactly 0 copies remaining."""
-    conn = sqlite3.connect(DB_NAME)
-    query = "SELECT id, name, author FROM books WHERE copies = 0"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+@st.cache_data(ttl=30)
+def get_stock_report(threshold=5):
+    """
+    Retrieves low-stock (1..threshold copies) and out-of-stock (0 copies) books with one query.
+    Returns the two DataFrames as (low_stock_df, out_of_stock_df).
+    """
+    df = query_df(SQL_GET_STOCK_REPORT, (threshold,))
+    low_stock_df = df[df['bucket'] == 'low'][['id', 'name', 'copies']].reset_index(drop=True)
+    out_of_stock_df = df[df['bucket'] == 'out'][['id', 'name', 'author']].reset_index(drop=True)
+    return low_stock_df, out_of_stock_df
 
+@st.cache_data(ttl=60)
 def get_user_orders(username):
     """Retrieves all orders placed by a specific user and converts timestamp to IST."""
-    conn = sqlite3.connect(DB_NAME)
-    query = f"""
+    query = """
     SELECT 
-        o.id AS Order_ID,
-        b.name AS Book_Name,
-        o.quantity AS Quantity,
-        o.status AS Status,
-        o.timestamp AS Order_Time
-    FROM orders o
-    JOIN books b ON o.book_id = b.id
-    WHERE o.username = ?
-    ORDER BY o.timestamp DESC
+        order_id AS Order_ID,
+        book_name AS Book_Name,
+        quantity AS Quantity,
+        status AS Status,
+        timestamp AS Order_Time
+    FROM orders_mv
+    WHERE username = ?
+    ORDER BY timestamp DESC
     """
-    df = pd.read_sql_query(query, conn, params=(username,))
-    conn.close()
+    df = query_df(query, (username,))
     
     # --- TIME ZONE CONVERSION (FIX) ---
     if not df.empty:
@@ -257,24 +409,56 @@ def get_user_orders(username):
     
     return df
 
+def get_orders_by_status(status, limit=None):
+    """Retrieves orders with the given status (newest first) for the admin view and converts timestamp to IST."""
+    query = """
+    SELECT 
+        order_id AS Order_ID,
+        username AS User,
+        book_name AS Book_Name,
+        quantity AS Quantity,
+        status AS Status,
+        timestamp AS Order_Time
+    FROM orders_mv
+    WHERE status = ?
+    ORDER BY timestamp DESC
+    """
+    params = (status,)
+    if limit is not None:
+        query += " LIMIT ?"
+        params += (limit,)
+    df = query_df(query, params)
+
+    # --- TIME ZONE CONVERSION (FIX for Admin View) ---
+    if not df.empty:
+        df['Order_Time'] = pd.to_datetime(df['Order_Time'])
+        df['Order_Time'] = df['Order_Time'].dt.tz_localize(pytz.utc)
+        df['Order_Time'] = df['Order_Time'].dt.tz_convert('Asia/Kolkata')
+        df['Order_Time'] = df['Order_Time'].dt.strftime('%Y-%m-%d %H:%M:%S IST')
+    # ----------------------------------------------------
+
+    return df
+
 def record_order_submission(cart_items, username):
     """Records a pending order submitted by a user."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_conn()
     c = conn.cursor()
-    
+
+    # Fetch stock for every book in the cart with a single query
+    book_ids = tuple(cart_items)
+    placeholders = ','.join('?' * len(book_ids))
+    c.execute(f"SELECT id, copies FROM books WHERE id IN ({placeholders})", book_ids)
+    stock = dict(c.fetchall())
+
     # Check current stock before recording the pending order
     for book_id, quantity in cart_items.items():
-        book = get_book_by_id(book_id)
-        if not book or book[3] < quantity:
-             conn.close()
-             return False, f"Stock error: Not enough copies of Book ID {book_id}."
-             
-        # Insert each cart item as a separate pending order row
-        c.execute("INSERT INTO orders (book_id, username, quantity, status) VALUES (?, ?, ?, ?)", 
-                  (book_id, username, quantity, 'Pending'))
-
-    conn.commit()
-    conn.close()
+        if stock.get(book_id, 0) < quantity:
+            return False, f"Stock error: Not enough copies of Book ID {book_id}."
+
+    # Insert each cart item as a separate pending order row, in one transaction
+    with write_transaction(c):
+        c.executemany(SQL_ADD_ORDER, [(book_id, username, quantity) for book_id, quantity in cart_items.items()])
+    get_user_orders.clear()
     return True, None
 
 def process_checkout(order_id):
@@ -282,43 +466,39 @@ def process_checkout(order_id):
     Admin function to finalize the order (change status, decrement stock).
     Returns success status, message, and the new stock level.
     """
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_conn()
     c = conn.cursor()
 
-    # 1. Get order details
-    c.execute("SELECT book_id, quantity FROM orders WHERE id = ? AND status = 'Pending'", (order_id,))
-    order_details = c.fetchone()
+    # BEGIN IMMEDIATE takes SQLite's write lock up front so the stock check and decrement are one atomic step.
+    # The early returns below have not changed any rows, so the transaction simply commits empty.
+    with write_transaction(c, begin="BEGIN IMMEDIATE"):
+        # 1. Get order details
+        c.execute(SQL_GET_PENDING_ORDER, (order_id,))
+        order_details = c.fetchone()
 
-    if not order_details:
-        conn.close()
-        return False, "Order not found or already processed.", 0
+        if not order_details:
+            return False, "Order not found or already processed.", 0
 
-    book_id, quantity = order_details
-    
-    # Verify stock one last time before processing
-    c.execute("SELECT copies FROM books WHERE id = ?", (book_id,))
-    current_copies = c.fetchone()[0]
+        book_id, quantity = order_details
+
+        # 2. Decrement stock only if enough copies remain (Inventory change happens ONLY on Admin Checkout)
+        c.execute(SQL_DECREMENT_STOCK, (quantity, book_id, quantity))
+        if c.rowcount == 0:
+            return False, f"Stock mismatch for Book ID {book_id}. Cannot complete checkout.", 0
+
+        # 3. Update order status
+        c.execute(SQL_COMPLETE_ORDER, (order_id,))
+
+        c.execute(SQL_GET_BOOK_COPIES, (book_id,))
+        new_copies = c.fetchone()[0]
+    get_stock_report.clear()
+    get_user_orders.clear()
 
-    if current_copies < quantity:
-        conn.close()
-        return False, f"Stock mismatch for Book ID {book_id}. Cannot complete checkout.", 0
-    
-    # Calculate new copies
-    new_copies = current_copies - quantity
-    
-    # 2. Decrement stock (Inventory change happens ONLY on Admin Checkout)
-    c.execute("UPDATE books SET copies = ? WHERE id = ?", (new_copies, book_id))
-    
-    # 3. Update order status
-    c.execute("UPDATE orders SET status = 'Completed' WHERE id = ?", (order_id,))
-    
-    conn.commit()
-    conn.close()
     # Return True, message, and the new stock level
     return True, f"Order {order_id} processed.", new_copies
 
 
-# Initialize the database when the app starts
+# Initialize the database when the app starts (cached, so later reruns skip it)
 init_db()
 
 # --- STREAMLIT UI AND LOGIC ---
@@ -387,18 +567,11 @@ def display_books(df):
     """
     st.header("📖 Available Books")
     
-    # --- Transform copies column (FIXED) ---
-    def format_copies(copies):
-        if str(copies) == '0':
-            # FIX: Return plain text only
-            return 'Out of Stock' 
-        return str(copies)
-
-    if 'copies' in df.columns:
-        df['Copies in Stock'] = df['copies'].apply(format_copies)
+    # --- Transform copies column (vectorized, plain text 'Out of Stock' for 0) ---
+    df['Copies in Stock'] = np.where(df['copies'] == 0, 'Out of Stock', df['copies'].astype(str))
     
-    # Drop the original numeric copies column
-    df_display = df.drop(columns=['copies'], errors='ignore')
+    # Select the display columns, leaving out the original numeric copies column
+    df_display = df[['id', 'name', 'author', 'Copies in Stock']]
     
     # Final display using st.dataframe 
     st.dataframe(
@@ -414,6 +587,136 @@ def display_books(df):
     )
 
 
+# --- FRAGMENTS ---
+# Interactive sections run as fragments, so changing one of their widgets reruns
+# only that section instead of the whole script (DB reads, CSS, sidebar, banner).
+
+@st.fragment
+def update_book_fragment():
+    """Book picker and edit form for 'Update Book Info'."""
+    books_df = get_all_books()
+    if not books_df.empty:
+        book_id_list = books_df['id'].tolist()
+        # Use names for better selection
+        book_names = dict(zip(book_id_list, (books_df['name'] + ' (ID: ' + books_df['id'].astype(str) + ')').tolist()))
+        # The widget returns the book ID directly; labels are only used for display
+        book_id_to_update = st.selectbox("Select Book to Update", book_id_list, format_func=book_names.get)
+
+        if book_id_to_update is not None:
+            current_book = get_book_by_id(book_id_to_update)
+
+            if current_book:
+                with st.form("update_book_form"):
+                    new_name = st.text_input("Book Name", value=current_book[1])
+                    new_author = st.text_input("Author Name", value=current_book[2])
+                    new_copies = st.number_input("Number of Copies", min_value=0, step=1, value=current_book[3])
+
+                    submitted = st.form_submit_button("Update Book")
+                    if submitted:
+                        update_book(book_id_to_update, new_name, new_author, new_copies)
+
+                        st.toast(f"✅ Book ID {book_id_to_update} details updated!", icon='✅')
+                        st.success(f"✅ The details for Book ID **{book_id_to_update}** have been updated!")
+                        time.sleep(1) 
+
+                        # Full rerun: the low stock banner outside this fragment may change
+                        st.rerun() 
+    else:
+        st.info("No books available to update.")
+
+
+@st.fragment
+def checkout_fragment(order_id_list):
+    """Order picker and checkout button for the admin 'View Orders' page."""
+    order_id_to_process = st.selectbox("Select Order ID to Checkout", order_id_list)
+
+    if st.button("✅ Process Checkout (Decrement Stock)"):
+        # Capture the new_copies count
+        success, message, new_copies = process_checkout(order_id_to_process)
+
+        if success:
+            st.success(f"Order {order_id_to_process} successfully checked out and stock updated!")
+
+            # --- LOW STOCK WARNING POP-UP ---
+            if new_copies <= 5:
+                st.warning(f"🚨 LOW STOCK ALERT: The remaining copies for this book are **{new_copies}**!")
+
+            # Full rerun: the pending orders table and stock banner live outside this fragment
+            st.rerun()
+        else:
+            st.error(f"Error processing order {order_id_to_process}: {message}")
+
+
+@st.fragment
+def cart_fragment():
+    """Add-to-cart controls, cart contents and order placement for regular users."""
+    st.header("🛒 Cart Management")
+    books_df = get_all_books()
+    books_in_stock = books_df[books_df['copies'] > 0]
+
+    if books_in_stock.empty:
+        st.info("Sorry, no books are currently in stock.")
+        return
+
+    # Index by book ID once so the selected book's details are hashed lookups
+    stock_map = books_in_stock.set_index('id')
+
+    st.subheader("Add Item to Cart")
+
+    book_options = dict(zip(
+        books_in_stock['id'].tolist(),
+        (books_in_stock['name'] + ' by ' + books_in_stock['author'] + ' (ID: ' + books_in_stock['id'].astype(str) + ')').tolist()
+    ))
+
+    if not book_options:
+        st.info("No books are available to add to cart.")
+        return
+
+    # The widget returns the book ID directly; labels are only used for display
+    selected_id = st.selectbox("Select a book", list(book_options), format_func=book_options.get)
+
+    max_copies = int(stock_map.at[selected_id, 'copies'])
+
+    quantity = st.number_input("Quantity", min_value=1, max_value=max_copies, step=1)
+
+    if st.button("Add to Cart"):
+        st.session_state.cart[selected_id] = st.session_state.cart.get(selected_id, 0) + quantity
+        st.success(f"{quantity} copy(s) of '{stock_map.at[selected_id, 'name']}' added to cart.")
+
+    st.subheader("Cart Contents")
+    if st.session_state.cart:
+        # Build the cart view from the already-loaded books_df instead of querying per item
+        cart_df = books_df[books_df['id'].isin(list(st.session_state.cart))][['id', 'name']].copy()
+        cart_df['Quantity'] = cart_df['id'].map(st.session_state.cart)
+        cart_df = cart_df.rename(columns={'id': 'Book ID', 'name': 'Name'})
+        total_quantity = int(cart_df['Quantity'].sum())
+
+        st.dataframe(cart_df, use_container_width=True, hide_index=True)
+        st.write(f"**Total Items:** {total_quantity}")
+
+        # --- ACTION BUTTON (User Places Order) ---
+
+        # Regular user places the order
+        if st.button("✅ Place Order"):
+            # Submit the cart contents as a pending order
+            current_user = st.session_state.current_user 
+            success, error_message = record_order_submission(st.session_state.cart, current_user)
+
+            if success:
+                st.session_state.cart = {} # Clear the cart
+
+                # --- DIALOGUE BOX EFFECT ---
+                st.balloons()
+                st.toast("🎉 ORDER PLACED!", icon="✅") 
+                st.success("Your order has been successfully submitted. An administrator will process it shortly.")
+
+                st.rerun(scope="fragment")
+            else:
+                 st.error(f"Could not place order: {error_message}")
+    else:
+        st.info("Your cart is empty.")
+
+
 def main_app():
     """The main application interface after login."""
     
@@ -425,7 +728,8 @@ def main_app():
         choice = st.sidebar.selectbox("Select Action", menu_options)
         
         # --- ADMIN LOW STOCK NOTIFICATION ---
-        low_stock_df = get_low_stock_books()
+        # One query serves both the low stock banner and the 'Books Out of Stock' page
+        low_stock_df, out_of_stock_df = get_stock_report()
         if not low_stock_df.empty:
             st.error(f"🚨 Inventory Alert: {len(low_stock_df)} book(s) are running low on stock!")
             with st.expander("Click to view low stock details"):
@@ -468,35 +772,7 @@ def main_app():
         elif manage_choice == "🔄 Update Book Info":
             st.subheader("🔄 Update Book Info")
             
-            books_df = get_all_books()
-            if not books_df.empty:
-                book_id_list = books_df['id'].tolist()
-                # Use names for better selection
-                book_names = {row['id']: f"{row['name']} (ID: {row['id']})" for index, row in books_df.iterrows()}
-                selected_book_option = st.selectbox("Select Book to Update", list(book_names.values()))
-                
-                if selected_book_option:
-                    # Retrieve the ID from the selected option string
-                    book_id_to_update = [k for k, v in book_names.items() if v == selected_book_option][0]
-                    current_book = get_book_by_id(book_id_to_update)
-                    
-                    if current_book:
-                        with st.form("update_book_form"):
-                            new_name = st.text_input("Book Name", value=current_book[1])
-                            new_author = st.text_input("Author Name", value=current_book[2])
-                            new_copies = st.number_input("Number of Copies", min_value=0, step=1, value=current_book[3])
-                            
-                            submitted = st.form_submit_button("Update Book")
-                            if submitted:
-                                update_book(book_id_to_update, new_name, new_author, new_copies)
-                                
-                                st.toast(f"✅ Book ID {book_id_to_update} details updated!", icon='✅')
-                                st.success(f"✅ The details for Book ID **{book_id_to_update}** have been updated!")
-                                time.sleep(1) 
-                                
-                                st.rerun() 
-            else:
-                st.info("No books available to update.")
+            update_book_fragment()
 
         elif manage_choice == "🗑️ Delete Book":
             st.subheader("🗑️ Delete Book")
@@ -525,32 +801,9 @@ def main_app():
             return
 
         st.header("📦 Order Processing (Admin)")
-        conn = sqlite3.connect(DB_NAME)
-        # Fetch ALL orders, showing status
-        query = """
-        SELECT 
-            o.id AS Order_ID,
-            o.username AS User,
-            b.name AS Book_Name,
-            o.quantity AS Quantity,
-            o.status AS Status,
-            o.timestamp AS Order_Time
-        FROM orders o
-        JOIN books b ON o.book_id = b.id
-        ORDER BY o.timestamp DESC
-        """
-        orders_df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        # --- TIME ZONE CONVERSION (FIX for Admin View) ---
-        if not orders_df.empty:
-            orders_df['Order_Time'] = pd.to_datetime(orders_df['Order_Time'])
-            orders_df['Order_Time'] = orders_df['Order_Time'].dt.tz_localize(pytz.utc)
-            orders_df['Order_Time'] = orders_df['Order_Time'].dt.tz_convert('Asia/Kolkata')
-            orders_df['Order_Time'] = orders_df['Order_Time'].dt.strftime('%Y-%m-%d %H:%M:%S IST')
-        # ----------------------------------------------------
-
-        pending_orders = orders_df[orders_df['Status'] == 'Pending']
+        # Each section fetches only its own status; completed history is capped at the latest 200
+        pending_orders = get_orders_by_status('Pending')
+        completed_orders = get_orders_by_status('Completed', limit=200)
 
         # --- PENDING ORDERS SECTION ---
         st.subheader("🔔 Pending Orders")
@@ -561,29 +814,12 @@ def main_app():
             st.markdown("---")
             st.subheader("Process Checkout")
             
-            order_id_list = pending_orders['Order_ID'].tolist()
-            order_id_to_process = st.selectbox("Select Order ID to Checkout", order_id_list)
-            
-            if st.button("✅ Process Checkout (Decrement Stock)"):
-                # Capture the new_copies count
-                success, message, new_copies = process_checkout(order_id_to_process)
-                
-                if success:
-                    st.success(f"Order {order_id_to_process} successfully checked out and stock updated!")
-                    
-                    # --- LOW STOCK WARNING POP-UP ---
-                    if new_copies <= 5:
-                        st.warning(f"🚨 LOW STOCK ALERT: The remaining copies for this book are **{new_copies}**!")
-                    
-                    st.rerun()
-                else:
-                    st.error(f"Error processing order {order_id_to_process}: {message}")
+            checkout_fragment(pending_orders['Order_ID'].tolist())
         else:
             st.info("No pending orders require processing.")
 
         # --- COMPLETED ORDERS SECTION ---
         st.subheader("History of Completed Orders")
-        completed_orders = orders_df[orders_df['Status'] == 'Completed']
         if not completed_orders.empty:
             st.dataframe(completed_orders, use_container_width=True)
         else:
@@ -621,8 +857,6 @@ def main_app():
         st.header("❌ Books Out of Stock")
         st.subheader("List of books with 0 copies remaining")
 
-        out_of_stock_df = get_out_of_stock_books()
-
         if not out_of_stock_df.empty:
             st.dataframe(out_of_stock_df, use_container_width=True,
                          column_config={
@@ -660,68 +894,7 @@ def main_app():
             st.error("Access Denied. Admins manage orders in 'View Orders'.")
             return
 
-        st.header("🛒 Cart Management")
-        books_df = get_all_books()
-        books_in_stock = books_df[books_df['copies'] > 0]
-
-        if books_in_stock.empty:
-            st.info("Sorry, no books are currently in stock.")
-            return
-
-        st.subheader("Add Item to Cart")
-        
-        book_options = {row['id']: f"{row['name']} by {row['author']} (ID: {row['id']})" for index, row in books_in_stock.iterrows()}
-        
-        if not book_options:
-            st.info("No books are available to add to cart.")
-            return
-
-        selected_option = st.selectbox("Select a book", list(book_options.values()))
-        
-        selected_id = list(book_options.keys())[list(book_options.values()).index(selected_option)]
-        
-        max_copies = books_in_stock[books_in_stock['id'] == selected_id]['copies'].iloc[0]
-        
-        quantity = st.number_input("Quantity", min_value=1, max_value=max_copies, step=1)
-        
-        if st.button("Add to Cart"):
-            st.session_state.cart[selected_id] = st.session_state.cart.get(selected_id, 0) + quantity
-            st.success(f"{quantity} copy(s) of '{books_in_stock[books_in_stock['id'] == selected_id]['name'].iloc[0]}' added to cart.")
-
-        st.subheader("Cart Contents")
-        if st.session_state.cart:
-            cart_items = []
-            total_quantity = 0
-            for book_id, qty in st.session_state.cart.items():
-                book = get_book_by_id(book_id)
-                if book:
-                    cart_items.append({"Book ID": book[0], "Name": book[1], "Quantity": qty})
-                    total_quantity += qty
-            
-            st.dataframe(pd.DataFrame(cart_items), use_container_width=True)
-            st.write(f"**Total Items:** {total_quantity}")
-
-            # --- ACTION BUTTON (User Places Order) ---
-            
-            # Regular user places the order
-            if st.button("✅ Place Order"):
-                # Submit the cart contents as a pending order
-                current_user = st.session_state.current_user 
-                success, error_message = record_order_submission(st.session_state.cart, current_user)
-                
-                if success:
-                    st.session_state.cart = {} # Clear the cart
-                    
-                    # --- DIALOGUE BOX EFFECT ---
-                    st.balloons()
-                    st.toast("🎉 ORDER PLACED!", icon="✅") 
-                    st.success("Your order has been successfully submitted. An administrator will process it shortly.")
-                    
-                    st.rerun()
-                else:
-                     st.error(f"Could not place order: {error_message}")
-        else:
-            st.info("Your cart is empty.")
+        cart_fragment()
 
 
 def run_app():